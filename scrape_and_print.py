@@ -15,19 +15,31 @@ import time
 import base64
 import argparse
 import logging
+import numpy as np
 import pandas as pd
 import re
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text, inspect, exc
+from sqlalchemy.pool import NullPool
+from psycopg2.extras import execute_values
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 from bs4 import BeautifulSoup
+import httpx
+import requests
 from requests.exceptions import RequestException
+import asyncio
+import collections
+import functools
+import io
+import multiprocessing
 import socket
+import threading
 from contextlib import contextmanager
 import urllib3
 import ssl
@@ -81,62 +93,206 @@ DEFAULT_STOCK_IDS = [
     "0001",
 ]
 
+# 熱路徑使用的 regex 統一在模組層編譯，避免迴圈內重複查 re 快取
+_RE_STOCK_ID = re.compile(r"\d{4}")
+_RE_DIGITS = re.compile(r"(\d+)")
+_RE_YEAR_MONTH = re.compile(r"(\d+)年(\d+)月")
+_RE_YEAR = re.compile(r"(\d+)年度")
+
+# 查無資料的頁面訊息，編成單一 regex 一次掃完整頁 HTML
+_NO_DATA_RE = re.compile(
+    "|".join(
+        map(re.escape, ["查無所需資料", "無此代號之公司", "尚無資料", "公司代號無效"])
+    )
+)
+
+# 主程序連線池大小；連線按需開啟，放大上限讓併發寫入不互相排隊
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+
+# 超過此列數時改用 COPY 進暫存表再合併，避免大批次 upsert 變慢
+COPY_THRESHOLD = 50
+
 # 重試參數
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # seconds
 DB_RETRY_DELAY = 10  # seconds
 DB_MAX_RETRIES = 5  # 資料庫連線重試次數
 
+# 平行爬取的預設 worker 數（每個 worker 佔用一個 Chrome 實例）
+DEFAULT_WORKERS = int(os.getenv("MOPS_WORKERS", min(4, os.cpu_count() or 1)))
+
+# MOPS SPA 背後的資料端點，可直接 POST 省去整個瀏覽器
+MOPS_API_URL = "https://mops.twse.com.tw/mops/api/t146sb05"
+
+# 非同步抓取時同時在途的請求上限
+MAX_CONCURRENT_FETCHES = int(os.getenv("MOPS_CONCURRENCY", "10"))
+
+# 對 MOPS 的 token bucket 參數：允許 MOPS_BURST 個請求的突發量，
+# 長期平均速率限制在每秒 MOPS_RATE 個
+RATE_CAPACITY = float(os.getenv("MOPS_BURST", "10"))
+RATE_PER_SEC = float(os.getenv("MOPS_RATE", str(10 / 30)))
+
+
+class TokenBucket:
+    """跨 process 的 token bucket 節流器
+
+    突發流量可立即消耗既有 token，持續流量才會被平均速率
+    擋下來，不像固定 sleep 把每支股票都拖慢。
+    lock 與 state 可由外部（main process）建立後傳入，
+    讓 spawn 出來的 worker 共享同一份配額。
+    """
+
+    def __init__(self, rate: float, capacity: float, lock=None, state=None):
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = lock if lock is not None else multiprocessing.Lock()
+        # state[0] = 目前 token 數、state[1] = 上次補充時間
+        self._state = (
+            state
+            if state is not None
+            else multiprocessing.Array("d", [capacity, 0.0])
+        )
+
+    def acquire(self) -> None:
+        """取得一個 token，必要時等待到補充為止"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(
+                    self.capacity,
+                    self._state[0] + (now - self._state[1]) * self.rate,
+                )
+                self._state[1] = now
+                if tokens >= 1.0:
+                    self._state[0] = tokens - 1.0
+                    return
+                self._state[0] = tokens
+                wait = (1.0 - tokens) / self.rate
+            time.sleep(wait)
+
+
+# 節流用的共享 bucket；多 process 模式下由 main 建立狀態並傳進 worker
+_bucket = TokenBucket(RATE_PER_SEC, RATE_CAPACITY)
+
+
+def _throttle():
+    """向共享 token bucket 要一個請求額度"""
+    _bucket.acquire()
+
 # 延遲初始化資料庫引擎
 engine = None
 
+# 每個執行緒快取一條長連線，避免每次 upsert 都重新 checkout
+_conn_cache = threading.local()
+
+# 每個 worker process 專屬的 WebDriver（由 pool initializer 建立）
+_worker_driver = None
+
+# 每個 process 共用的 HTTP session，重用 keep-alive 連線
+_http_session = None
+
+
+def _get_http_session():
+    """取得（必要時建立）共用的 requests.Session"""
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        session.headers.update(
+            {
+                "User-Agent": (
+                    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                    "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+                ),
+                "Accept-Language": "zh-TW,zh;q=0.9",
+            }
+        )
+        _http_session = session
+    return _http_session
+
+
+def _create_engine_with_retry(poolclass=None):
+    """建立資料庫引擎並驗證連線，失敗時重試
+
+    主程序使用明確大小的 QueuePool；multiprocess worker 傳入
+    NullPool，讓每個 process 自己管理單一連線。
+    """
+    kwargs = dict(
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        # 經由 SQLAlchemy 的 executemany（如 to_sql 備援路徑）時，
+        # 自動改寫為多列 VALUES 批次而非逐列送出
+        executemany_mode="values_plus_batch",
+        executemany_batch_page_size=500,
+        insertmanyvalues_page_size=1000,
+        connect_args={
+            "connect_timeout": 30,  # 連線超時時間
+            "application_name": "twstock_crawler",  # 應用名稱便於識別
+        },
+    )
+    if poolclass is not None:
+        kwargs["poolclass"] = poolclass
+    else:
+        kwargs.update(
+            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=30
+        )
+
+    for attempt in range(1, DB_MAX_RETRIES + 1):
+        try:
+            logger.info(f"嘗試連接資料庫 (第 {attempt} 次嘗試)...")
+            new_engine = create_engine(DATABASE_URL, **kwargs)
+            # 測試連線
+            with new_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            logger.info("資料庫連線成功")
+            return new_engine
+        except (exc.OperationalError, exc.DatabaseError) as e:
+            logger.error(f"資料庫連線失敗: {str(e)}")
+            if attempt < DB_MAX_RETRIES:
+                logger.info(f"等待 {DB_RETRY_DELAY} 秒後重試...")
+                time.sleep(DB_RETRY_DELAY)
+            else:
+                logger.error("無法連接到資料庫，已達最大重試次數")
+                raise
+
+
 @contextmanager
 def get_db_connection():
-    """獲取資料庫連線，帶有錯誤處理和重試邏輯"""
+    """獲取資料庫連線，帶有錯誤處理和重試邏輯
+
+    連線以 thread-local 快取重複使用；交易邊界由呼叫端的
+    conn.begin() / conn.commit() 控制。
+    """
     global engine
-    
+
     if engine is None:
-        for attempt in range(1, DB_MAX_RETRIES + 1):
-            try:
-                logger.info(f"嘗試連接資料庫 (第 {attempt} 次嘗試)...")
-                engine = create_engine(
-                    DATABASE_URL, 
-                    pool_pre_ping=True,
-                    pool_recycle=3600,
-                    connect_args={
-                        "connect_timeout": 30,  # 連線超時時間
-                        "application_name": "twstock_crawler"  # 應用名稱便於識別
-                    }
-                )
-                # 測試連線
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-                logger.info("資料庫連線成功")
-                break
-            except (exc.OperationalError, exc.DatabaseError) as e:
-                logger.error(f"資料庫連線失敗: {str(e)}")
-                if attempt < DB_MAX_RETRIES:
-                    logger.info(f"等待 {DB_RETRY_DELAY} 秒後重試...")
-                    time.sleep(DB_RETRY_DELAY)
-                else:
-                    logger.error("無法連接到資料庫，已達最大重試次數")
-                    raise
-    
+        engine = _create_engine_with_retry()
+
+    connection = getattr(_conn_cache, "conn", None)
+    if connection is None or connection.closed:
+        connection = engine.connect()
+        _conn_cache.conn = connection
+
     try:
-        # 使用預先建立的引擎創建連線
-        with engine.connect() as connection:
-            yield connection
+        yield connection
+        # 清掉殘留的隱式交易，避免快取連線卡在 idle in transaction
+        if connection.in_transaction():
+            connection.rollback()
     except Exception as e:
         logger.error(f"資料庫操作錯誤: {str(e)}")
-        # 若連線失敗，標記引擎為 None，下次會重新初始化
-        if "connection" in str(e).lower() or "timeout" in str(e).lower():
-            logger.warning("連線問題，將重置資料庫引擎")
-            engine = None
+        # 讓 pool 丟棄底層 DBAPI 連線並釋放快取，下次重新 checkout；
+        # 斷線重連交給 pool_pre_ping，引擎本身不需要重建
+        try:
+            connection.invalidate()
+        except Exception:
+            pass
+        _conn_cache.conn = None
         raise
 
 
-def setup_driver(download_dir: str, headless=True):
-    """設置並返回 Selenium WebDriver"""
+@functools.lru_cache(maxsize=4)
+def _build_chrome_options(download_dir: str, headless: bool = True) -> Options:
+    """組出 Chrome 啟動選項，依 (下載目錄, headless) 快取重用"""
     opts = Options()
     if headless:
         for flag in [
@@ -151,15 +307,27 @@ def setup_driver(download_dir: str, headless=True):
     opts.add_argument("--lang=zh-TW")
     opts.add_argument("--kiosk-printing")  # PDF 列印
     opts.add_argument("--disable-blink-features=AutomationControlled")
+    # 只需要表格 HTML，不載入圖片／擴充功能／背景連線以加速抓取
+    opts.add_argument("--blink-settings=imagesEnabled=false")
+    opts.add_argument("--disable-extensions")
+    opts.add_argument("--disable-translate")
+    opts.add_argument("--disable-background-networking")
     opts.add_experimental_option("excludeSwitches", ["enable-automation"])
     opts.add_experimental_option("useAutomationExtension", False)
-    
-    download_dir = os.path.abspath(download_dir)
+
     prefs = {
         "download.default_directory": download_dir,
         "download.prompt_for_download": False,
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
     }
     opts.add_experimental_option("prefs", prefs)
+    return opts
+
+
+def setup_driver(download_dir: str, headless=True):
+    """設置並返回 Selenium WebDriver"""
+    opts = _build_chrome_options(os.path.abspath(download_dir), headless)
 
     try:
         # 在 selenium/standalone-chrome 容器中，Chrome 已經運行在 localhost:4444
@@ -172,6 +340,36 @@ def setup_driver(download_dir: str, headless=True):
         raise
 
 
+@contextmanager
+def mops_driver(download_dir: str = None):
+    """建立共用 WebDriver、註冊為模組層共用實例，結束時關閉
+
+    供循序模式在 main 內以 with 包住整個批次使用。
+    """
+    global _worker_driver
+    _worker_driver = setup_driver(download_dir or DOWNLOAD_DIR)
+    try:
+        yield _worker_driver
+    finally:
+        try:
+            _worker_driver.quit()
+        finally:
+            _worker_driver = None
+
+
+def _recreate_shared_driver(dead_driver):
+    """共用 driver 的 session 掛掉時，關閉並重建一個"""
+    global _worker_driver
+    try:
+        dead_driver.quit()
+    except Exception:
+        pass
+    new_driver = setup_driver(DOWNLOAD_DIR)
+    if dead_driver is _worker_driver or _worker_driver is None:
+        _worker_driver = new_driver
+    return new_driver
+
+
 def setup_database() -> bool:
     """設置資料庫表格結構"""
     ddl_statements = [
@@ -241,33 +439,46 @@ def setup_database() -> bool:
             CONSTRAINT cash_flow_unique UNIQUE (company_id, year)
         )
         """,
+        # verify_db 以 company_id 過濾各表，為非 PK 的表補上索引
+        # 讓 COUNT 走 index lookup 而非隨資料量成長的 seq-scan
+        "CREATE INDEX IF NOT EXISTS idx_company_revenue_cid ON company_revenue(company_id)",
+        "CREATE INDEX IF NOT EXISTS idx_balance_sheet_cid ON balance_sheet(company_id)",
+        "CREATE INDEX IF NOT EXISTS idx_income_statement_cid ON income_statement(company_id)",
+        "CREATE INDEX IF NOT EXISTS idx_cash_flow_cid ON cash_flow(company_id)",
+        # 合併表改為 materialized view，從三張財報表推導而非重複寫入；
+        # 先移除舊版部署留下的同名實體表
         """
-        CREATE TABLE IF NOT EXISTS financial_data_combined (
-            id SERIAL PRIMARY KEY,
-            company_id VARCHAR(10) NOT NULL,
-            year INT NOT NULL,
-            total_assets DECIMAL(20, 2),
-            total_liabilities DECIMAL(20, 2),
-            total_equity DECIMAL(20, 2),
-            net_worth_per_share DECIMAL(10, 2),
-            operating_revenue DECIMAL(20, 2),
-            operating_profit DECIMAL(20, 2),
-            profit_before_tax DECIMAL(20, 2),
-            earnings_per_share DECIMAL(10, 2),
-            operating_cash_flow DECIMAL(20, 2),
-            investing_cash_flow DECIMAL(20, 2),
-            financing_cash_flow DECIMAL(20, 2),
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            CONSTRAINT financial_data_combined_unique UNIQUE (company_id, year)
-        )
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM pg_tables WHERE tablename = 'financial_data_combined'
+            ) THEN
+                DROP TABLE financial_data_combined;
+            END IF;
+        END $$
+        """,
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS financial_data_combined AS
+        SELECT b.company_id, b.year,
+               b.total_assets, b.total_liabilities, b.total_equity,
+               b.net_worth_per_share,
+               i.operating_revenue, i.operating_profit, i.profit_before_tax,
+               i.earnings_per_share,
+               c.operating_cash_flow, c.investing_cash_flow, c.financing_cash_flow
+        FROM balance_sheet b
+        JOIN income_statement i USING (company_id, year)
+        JOIN cash_flow c USING (company_id, year)
         """,
+        # REFRESH ... CONCURRENTLY 需要唯一索引
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_data_combined_cid_year "
+        "ON financial_data_combined(company_id, year)",
     ]
     try:
-        # 使用 context manager 獲取資料庫連線
+        # 合併成單一多語句字串，一次往返、一次 COMMIT
+        combined_ddl = ";\n".join(ddl_statements)
         with get_db_connection() as conn:
-            for ddl in ddl_statements:
-                conn.execute(text(ddl))
-            conn.commit()
+            with conn.begin():
+                conn.connection.cursor().execute(combined_ddl)
         logger.info("資料庫表格結構設置完成")
         return True
     except Exception as e:
@@ -277,54 +488,116 @@ def setup_database() -> bool:
 
 def validate_stock_id(company_id: str) -> bool:
     """驗證股票代碼格式是否為四位數字"""
-    if not re.fullmatch(r"\d{4}", company_id):
+    if not _RE_STOCK_ID.fullmatch(company_id):
         logger.warning(f"股票代碼 {company_id} 格式不正確")
         return False
     return True
 
 
-def check_data_available(driver, company_id: str) -> bool:
-    """檢查頁面是否包含有效公司資料"""
+def check_data_available_html(html: str, company_id: str) -> bool:
+    """檢查已抓取的頁面 HTML 是否包含有效公司資料
+
+    直接對字串檢查，避免為了確認可用性再跟 Chrome 多做一次
+    DOM 序列化與 find_elements 往返。
+    """
     try:
-        page = driver.page_source
-        for msg in ["查無所需資料", "無此代號之公司", "尚無資料", "公司代號無效"]:
-            if msg in page:
-                logger.error(f"{company_id} 查無資料，訊息：{msg}")
-                return False
-        tables = driver.find_elements(By.TAG_NAME, "table")
-        if not tables:
+        # 先做便宜的子字串檢查，完全沒表格就不必再跑 regex 掃描
+        if "<table" not in html:
             logger.error(f"{company_id} 無表格數據")
             return False
+        m = _NO_DATA_RE.search(html)
+        if m:
+            logger.error(f"{company_id} 查無資料，訊息：{m.group(0)}")
+            return False
         return True
     except Exception:
         logger.exception("檢查資料可用性時出錯")
         return False
 
 
-def get_mops_company_info_pdf(company_id: str, output_path: str = None):
+def _parse_tables(html: str) -> list:
+    """從頁面 HTML 解出下游需要的前四張表格
+
+    先用 lxml 版 BeautifulSoup 解析一次，只把目標 <table> 片段
+    交給 pd.read_html，不讓 pandas 重複掃整頁；lxml 讀不動的
+    頁面再整頁退回 html5lib。
+    """
+    soup = BeautifulSoup(html, "lxml")
+    wanted = soup.find_all("table")[:4]
+    try:
+        return [
+            pd.read_html(io.StringIO(str(t)), flavor="lxml")[0] for t in wanted
+        ]
+    except ValueError:
+        return pd.read_html(io.StringIO(html), flavor="html5lib")
+
+
+def get_mops_company_info_http(company_id: str, session=None):
+    """直接 POST MOPS 資料端點取得公司資料，完全不經過瀏覽器
+
+    成功回傳 list_of_dataframes；查無資料或端點不合作時回傳 None，
+    由呼叫端決定是否退回 Selenium 路徑。
+    """
+    if session is None:
+        session = _get_http_session()
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            resp = session.post(
+                MOPS_API_URL,
+                json={"companyId": company_id},
+                timeout=10,
+                verify=False,
+            )
+            resp.raise_for_status()
+            html = resp.text
+
+            if not check_data_available_html(html, company_id):
+                return None
+            dfs = _parse_tables(html)
+            if not dfs:
+                # 回應不是可解析的表格頁（例如被導向驗證頁）
+                logger.warning(f"{company_id} HTTP 回應無法解析為表格")
+                return None
+            return dfs
+        except RequestException as e:
+            logger.warning(f"{company_id} HTTP 抓取失敗 (第 {attempt} 次): {str(e)}")
+            time.sleep(RETRY_DELAY)
+
+    return None
+
+
+def get_mops_company_info_pdf(
+    company_id: str, output_path: str = None, driver=None, generate_pdf: bool = True
+):
     """
     使用 Selenium 從公開資訊觀測站獲取公司資料並生成 PDF
-    返回: (pdf_path, list_of_dataframes) 或 (None, None)
+    可傳入既有 driver 重用瀏覽器 session；未傳入時依序使用
+    worker 常駐 driver 或為本次呼叫建立一個。
+    generate_pdf=False 時跳過 Page.printToPDF，只回傳表格資料。
+    返回: (pdf_path, list_of_dataframes) 或 (None, None)；
+    未產生 PDF 時 pdf_path 為 None。
     """
     if output_path is None:
         output_path = os.path.join(DOWNLOAD_DIR, f"mops_{company_id}.pdf")
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    driver = None
+    explicit_driver = driver
+    if driver is None:
+        driver = _worker_driver
+    # 只有在完全沒有可重用的 driver 時才自行建立（並於結束時關閉）
+    own_driver = driver is None
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            # 設置 Chrome 選項
-            options = Options()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--lang=zh-TW")
-            
-            # 在 selenium/standalone-chrome 中不指定 Service
-            # 此映像已經配置好 ChromeDriver
-            driver = webdriver.Chrome(options=options)
-            
+            if own_driver:
+                driver = setup_driver(DOWNLOAD_DIR)
+            else:
+                if explicit_driver is None:
+                    # 共用 driver 可能在前一次重試中被重建
+                    driver = _worker_driver
+                # 重用 session：清掉 cookie 當作股票之間的重置
+                driver.delete_all_cookies()
+
             # 偽裝為非自動化
             driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
@@ -338,31 +611,61 @@ def get_mops_company_info_pdf(company_id: str, output_path: str = None):
                 EC.presence_of_element_located((By.TAG_NAME, "table"))
             )
 
-            if not check_data_available(driver, company_id):
+            # page_source 會序列化整個 DOM，只取一次、重複使用
+            html = driver.page_source
+
+            if not check_data_available_html(html, company_id):
                 return None, None
 
-            html = driver.page_source
-            dfs = pd.read_html(html, flavor="html5lib")
+            dfs = _parse_tables(html)
+
+            # 轉 PDF（資料流程用不到時可整段跳過，省下 CDP 往返）
+            if not generate_pdf:
+                return None, dfs
 
-            # 轉 PDF
+            # 以 stream 模式分段讀取，避免整份 PDF 的 base64 佔用記憶體
             pdf = driver.execute_cdp_cmd(
                 "Page.printToPDF",
                 {
                     "printBackground": True,
                     "preferCSSPageSize": True,
+                    "transferMode": "ReturnAsStream",
                 },
             )
-            with open(output_path, "wb") as f:
-                f.write(base64.b64decode(pdf["data"]))
+            stream = pdf["stream"]
+            try:
+                with open(output_path, "wb") as f:
+                    while True:
+                        chunk = driver.execute_cdp_cmd(
+                            "IO.read", {"handle": stream, "size": 65536}
+                        )
+                        data = chunk.get("data", "")
+                        if chunk.get("base64Encoded"):
+                            f.write(base64.b64decode(data))
+                        else:
+                            f.write(data.encode())
+                        if chunk.get("eof"):
+                            break
+            finally:
+                driver.execute_cdp_cmd("IO.close", {"handle": stream})
 
             return os.path.abspath(output_path), dfs
 
+        except WebDriverException as e:
+            logger.exception(
+                f"第 {attempt} 次嘗試載入 {company_id} 時 WebDriver 失敗: {str(e)}"
+            )
+            # 共用 session 掛掉時重建，重試與後續股票才有活的 driver
+            if not own_driver:
+                driver = _recreate_shared_driver(driver)
+            time.sleep(RETRY_DELAY)
         except Exception as e:
             logger.exception(f"第 {attempt} 次嘗試載入 {company_id} 時失敗: {str(e)}")
             time.sleep(RETRY_DELAY)
         finally:
-            if driver:
+            if own_driver and driver is not None:
                 driver.quit()
+                driver = None
 
     return None, None
 
@@ -393,7 +696,7 @@ def process_basic_info(company_id: str, df: pd.DataFrame) -> pd.DataFrame:
                 df_out["capital"]
                 .astype(str)
                 .str.replace(",", "")
-                .str.extract(r"(\d+)", expand=False)
+                .str.extract(_RE_DIGITS, expand=False)
                 .astype(float, errors="ignore")
             )
         return df_out
@@ -403,8 +706,12 @@ def process_basic_info(company_id: str, df: pd.DataFrame) -> pd.DataFrame:
 
 
 def parse_revenue_data(df: pd.DataFrame, company_id: str) -> pd.DataFrame:
-    """解析營收資料，回傳結構化 DataFrame"""
-    records = []
+    """解析營收資料，回傳結構化 DataFrame
+
+    月營收以欄位為單位向量化處理（slice + Series.str 操作），
+    避免逐列的 Python 迴圈。
+    """
+    frames = []
     try:
         # 找到標題列
         header_idx = None
@@ -417,140 +724,215 @@ def parse_revenue_data(df: pd.DataFrame, company_id: str) -> pd.DataFrame:
         # 累計營收 (第1列)
         if len(df) > 1:
             ytd = df.iloc[1].astype(str).tolist()
-            cr, pr, gr = (
-                pd.to_numeric(ytd[0].replace(",", ""), errors="coerce"),
-                pd.to_numeric(ytd[1].replace(",", ""), errors="coerce"),
-                pd.to_numeric(ytd[2].replace("%", ""), errors="coerce"),
-            )
-            records.append(
-                {
-                    "company_id": company_id,
-                    "year": pd.Timestamp.now().year,
-                    "month": pd.Timestamp.now().month,
-                    "revenue_type": "accumulated",
-                    "current_revenue": cr,
-                    "previous_revenue": pr,
-                    "growth_rate": gr,
-                }
-            )
-        # 月營收 (後續成對列)
-        for i in range(2, len(df), 2):
-            title = str(df.iloc[i, 0])
-            m = re.search(r"(\d+)年(\d+)月", title)
-            if not m or i + 1 >= len(df):
-                continue
-            y, mth = int(m.group(1)) + 1911, int(m.group(2))
-            row = df.iloc[i + 1].astype(str).tolist()
-            cr, pr, gr = (
-                pd.to_numeric(row[0].replace(",", ""), errors="coerce"),
-                pd.to_numeric(row[1].replace(",", ""), errors="coerce"),
-                pd.to_numeric(row[2].replace("%", ""), errors="coerce"),
+            now = pd.Timestamp.now()
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "company_id": [company_id],
+                        "year": [now.year],
+                        "month": [now.month],
+                        "revenue_type": ["accumulated"],
+                        "current_revenue": [
+                            pd.to_numeric(ytd[0].replace(",", ""), errors="coerce")
+                        ],
+                        "previous_revenue": [
+                            pd.to_numeric(ytd[1].replace(",", ""), errors="coerce")
+                        ],
+                        "growth_rate": [
+                            pd.to_numeric(ytd[2].replace("%", ""), errors="coerce")
+                        ],
+                    }
+                )
             )
-            records.append(
+        # 月營收 (後續成對列)：標題列在偶數列、數值列在其下一列
+        if len(df) > 3:
+            titles = df.iloc[2::2, 0].astype(str).reset_index(drop=True)
+            values = df.iloc[3::2, :3].astype(str).reset_index(drop=True)
+            n = min(len(titles), len(values))
+            titles, values = titles.iloc[:n], values.iloc[:n]
+
+            ym = titles.str.extract(_RE_YEAR_MONTH)
+            monthly = pd.DataFrame(
                 {
                     "company_id": company_id,
-                    "year": y,
-                    "month": mth,
+                    "year": pd.to_numeric(ym[0], errors="coerce") + 1911,
+                    "month": pd.to_numeric(ym[1], errors="coerce"),
                     "revenue_type": "monthly",
-                    "current_revenue": cr,
-                    "previous_revenue": pr,
-                    "growth_rate": gr,
+                    "current_revenue": pd.to_numeric(
+                        values.iloc[:, 0].str.replace(",", "", regex=False),
+                        errors="coerce",
+                    ),
+                    "previous_revenue": pd.to_numeric(
+                        values.iloc[:, 1].str.replace(",", "", regex=False),
+                        errors="coerce",
+                    ),
+                    "growth_rate": pd.to_numeric(
+                        values.iloc[:, 2].str.replace("%", "", regex=False),
+                        errors="coerce",
+                    ),
                 }
             )
+            # 標題不含「N年N月」的列比照舊邏輯跳過
+            monthly = monthly.dropna(subset=["year", "month"])
+            monthly["year"] = monthly["year"].astype(int)
+            monthly["month"] = monthly["month"].astype(int)
+            frames.append(monthly)
     except Exception:
         logger.exception("解析營收資料失敗")
-    return pd.DataFrame(records)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+# 各資料表的 conflict key；update 欄位為該表其餘所有欄位
+_TABLE_CONFLICT_COLS = {
+    "company_info": ["company_id"],
+    "company_revenue": ["company_id", "year", "month", "revenue_type"],
+    "balance_sheet": ["company_id", "year"],
+    "income_statement": ["company_id", "year"],
+    "cash_flow": ["company_id", "year"],
+}
+
+# 財報合併 DataFrame 之中，各財報表各自需要的欄位
+_FIN_TABLE_COLS = {
+    "balance_sheet": [
+        "company_id",
+        "year",
+        "total_assets",
+        "total_liabilities",
+        "total_equity",
+        "net_worth_per_share",
+    ],
+    "income_statement": [
+        "company_id",
+        "year",
+        "operating_revenue",
+        "operating_profit",
+        "profit_before_tax",
+        "earnings_per_share",
+    ],
+    "cash_flow": [
+        "company_id",
+        "year",
+        "operating_cash_flow",
+        "investing_cash_flow",
+        "financing_cash_flow",
+    ],
+}
+
+# 財報欄位對應來源表格的列索引
+_FIN_FIELD_ROWS = {
+    "total_assets": 1,
+    "total_liabilities": 2,
+    "total_equity": 3,
+    "net_worth_per_share": 4,
+    "operating_revenue": 6,
+    "operating_profit": 7,
+    "profit_before_tax": 8,
+    "earnings_per_share": 9,
+    "operating_cash_flow": 11,
+    "investing_cash_flow": 12,
+    "financing_cash_flow": 13,
+}
 
 
 def process_financial_statements(df: pd.DataFrame, company_id: str) -> pd.DataFrame:
-    """解析財報資料，回傳 balance_sheet, income_statement, cash_flow 合併 DataFrame"""
+    """解析財報資料，回傳 balance_sheet, income_statement, cash_flow 合併 DataFrame
+
+    每個欄位預先配置一條 numpy 陣列逐年填入，最後以欄位字典
+    一次建出 DataFrame，省去逐列 dict 與三表 merge 的成本。
+    """
     try:
         # 找年度欄位
-        years = []
+        year_cols, years = [], []
         for col in df.columns:
-            m = re.search(r"(\d+)年度", str(col))
+            m = _RE_YEAR.search(str(col))
             if m:
-                years.append(int(m.group(1)))
-        if not years:
+                year_cols.append(col)
+                years.append(int(m.group(1)) + 1911)
+        if not year_cols:
             return pd.DataFrame()
-        bs_rows, is_rows, cf_rows = [], [], []
-        for idx, col in enumerate(df.columns):
-            if "年度" not in str(col):
-                continue
-            y = years.pop(0) + 1911
-            vals = df[col].astype(str).tolist()
-            # 根據索引加入
-            bs_rows.append(
-                {
-                    "company_id": company_id,
-                    "year": y,
-                    "total_assets": pd.to_numeric(vals[1], errors="coerce"),
-                    "total_liabilities": pd.to_numeric(vals[2], errors="coerce"),
-                    "total_equity": pd.to_numeric(vals[3], errors="coerce"),
-                    "net_worth_per_share": pd.to_numeric(vals[4], errors="coerce"),
-                }
-            )
-            is_rows.append(
-                {
-                    "company_id": company_id,
-                    "year": y,
-                    "operating_revenue": pd.to_numeric(vals[6], errors="coerce"),
-                    "operating_profit": pd.to_numeric(vals[7], errors="coerce"),
-                    "profit_before_tax": pd.to_numeric(vals[8], errors="coerce"),
-                    "earnings_per_share": pd.to_numeric(vals[9], errors="coerce"),
-                }
-            )
-            cf_rows.append(
-                {
-                    "company_id": company_id,
-                    "year": y,
-                    "operating_cash_flow": pd.to_numeric(vals[11], errors="coerce"),
-                    "investing_cash_flow": pd.to_numeric(vals[12], errors="coerce"),
-                    "financing_cash_flow": pd.to_numeric(vals[13], errors="coerce"),
-                }
+
+        # 所有年度欄位當成一個 2-D 區塊一次轉數值，
+        # 之後直接以列索引切出各欄位橫跨所有年度的值
+        block = df[year_cols].astype("string")
+        nums = block.apply(
+            lambda s: pd.to_numeric(
+                s.str.replace(",", "", regex=False), errors="coerce"
             )
-        # 合併
-        df_bs = pd.DataFrame(bs_rows)
-        df_is = pd.DataFrame(is_rows)
-        df_cf = pd.DataFrame(cf_rows)
-        df_combined = df_bs.merge(df_is, on=["company_id", "year"]).merge(
-            df_cf, on=["company_id", "year"]
-        )
-        return df_combined
+        ).to_numpy()
+        if nums.shape[0] <= max(_FIN_FIELD_ROWS.values()):
+            logger.warning("財報表格列數不足，略過")
+            return pd.DataFrame()
+
+        n = len(year_cols)
+        data = {"company_id": np.full(n, company_id), "year": np.array(years)}
+        for field, row_idx in _FIN_FIELD_ROWS.items():
+            data[field] = nums[row_idx]
+        return pd.DataFrame(data)
     except Exception:
         logger.exception("解析財報資料失敗")
         return pd.DataFrame()
 
 
+@functools.lru_cache(maxsize=32)
+def _build_upsert_sql(
+    table: str, cols: tuple, conflict_cols: tuple, update_cols: tuple
+) -> str:
+    """組出 execute_values 用的 upsert SQL，依 (table, 欄位組合) 快取"""
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in update_cols)
+    return (
+        f"INSERT INTO {table} ({', '.join(cols)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(conflict_cols)}) DO UPDATE "
+        f"SET {updates}, updated_at = CURRENT_TIMESTAMP"
+    )
+
+
+def _upsert_on_conn(
+    conn, df: pd.DataFrame, table: str, conflict_cols: list, update_cols: list
+):
+    """在既有連線上 upsert DataFrame，交易邊界由呼叫端控制
+
+    使用 psycopg2 的 execute_values 將多列合併為單一 INSERT 語句，
+    避免 executemany 逐列往返資料庫的慢路徑。
+    """
+    if df.empty:
+        return 0
+
+    sql = _build_upsert_sql(
+        table, tuple(df.columns), tuple(conflict_cols), tuple(update_cols)
+    )
+    # NaN 轉為 None，讓 psycopg2 寫入 NULL；
+    # itertuples(name=None) 已產出純 tuple，直接收集即可
+    rows = list(
+        df.astype(object)
+        .where(pd.notnull(df), None)
+        .itertuples(index=False, name=None)
+    )
+    cur = conn.connection.cursor()
+    execute_values(cur, sql, rows, page_size=1000)
+    return cur.rowcount
+
+
 def upsert_dataframe(
     df: pd.DataFrame, table: str, conflict_cols: list, update_cols: list
 ):
-    """批次 upsert DataFrame 到資料庫"""
+    """批次 upsert DataFrame 到資料庫（自行開啟連線的薄包裝）
+
+    大批次（超過 COPY_THRESHOLD 列）改走 COPY 路徑。
+    """
     if df.empty:
         return 0
-    
+    if len(df) > COPY_THRESHOLD:
+        return upsert_dataframe_copy(df, table, conflict_cols, update_cols)
+
     # 重試邏輯
     for attempt in range(1, DB_MAX_RETRIES + 1):
         try:
-            cols = df.columns.tolist()
-            insert_cols = ", ".join(cols)
-            values = ", ".join(f":{c}" for c in cols)
-            updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in update_cols)
-            sql = text(
-                f"""
-                INSERT INTO {table} ({insert_cols})
-                VALUES ({values})
-                ON CONFLICT ({', '.join(conflict_cols)}) DO UPDATE
-                  SET {updates}, updated_at = CURRENT_TIMESTAMP
-                """
-            )
-            
-            # 使用 context manager 獲取連線
             with get_db_connection() as conn:
-                result = conn.execute(sql, df.to_dict(orient="records"))
-                conn.commit()
-                return result.rowcount
-                
+                with conn.begin():
+                    return _upsert_on_conn(conn, df, table, conflict_cols, update_cols)
+
         except Exception as e:
             logger.error(f"寫入資料庫時出錯 (嘗試 {attempt}/{DB_MAX_RETRIES}): {str(e)}")
             if attempt < DB_MAX_RETRIES:
@@ -559,109 +941,328 @@ def upsert_dataframe(
             else:
                 logger.error("已達最大重試次數，放棄寫入")
                 raise
-    
+
+    return 0
+
+
+@functools.lru_cache(maxsize=32)
+def _build_copy_merge_sql(
+    table: str, cols: tuple, conflict_cols: tuple, update_cols: tuple
+) -> str:
+    """組出 COPY 暫存表之後的 INSERT ... SELECT 合併 SQL，同樣快取"""
+    col_list = ", ".join(cols)
+    updates = ", ".join(f"{c}=EXCLUDED.{c}" for c in update_cols)
+    return (
+        f"INSERT INTO {table} ({col_list}) "
+        f"SELECT {col_list} FROM _stg_{table} "
+        f"ON CONFLICT ({', '.join(conflict_cols)}) DO UPDATE "
+        f"SET {updates}, updated_at = CURRENT_TIMESTAMP"
+    )
+
+
+def _stage_df(conn, df: pd.DataFrame, table: str) -> None:
+    """把 DataFrame 倒進暫存表，供後續 INSERT ... SELECT 合併
+
+    用 to_sql 的 method='multi' 以多列 VALUES 批次寫入，
+    是 raw cursor 不支援 COPY 時的備援載入路徑。
+    """
+    df.to_sql(
+        table,
+        conn,
+        if_exists="replace",
+        index=False,
+        method="multi",
+        chunksize=1000,
+    )
+
+
+def _copy_upsert_on_conn(
+    conn, df: pd.DataFrame, table: str, conflict_cols: list, update_cols: list
+):
+    """在既有連線上以 COPY 進暫存表再合併的方式 upsert
+
+    先把 DataFrame 以 CSV 格式 COPY 進 TEMP TABLE，
+    再用一句 INSERT ... SELECT ... ON CONFLICT 合併進目標表，
+    比逐批 INSERT 快上數十倍。交易邊界由呼叫端控制。
+    """
+    if df.empty:
+        return 0
+
+    col_list = ", ".join(df.columns)
+    merge_sql = _build_copy_merge_sql(
+        table, tuple(df.columns), tuple(conflict_cols), tuple(update_cols)
+    )
+
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+
+    # 暫存表名帶上目標表名，同一交易內多張表的 COPY 不會互撞
+    stg = f"_stg_{table}"
+    cur = conn.connection.cursor()
+    if hasattr(cur, "copy_expert"):
+        cur.execute(
+            f"CREATE TEMP TABLE {stg} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cur.copy_expert(
+            f"COPY {stg} ({col_list}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')",
+            buf,
+        )
+        cur.execute(merge_sql)
+        rowcount = cur.rowcount
+    else:
+        # 非 psycopg2 driver：退回 to_sql 的多列 INSERT 暫存
+        _stage_df(conn, df, stg)
+        cur.execute(merge_sql)
+        rowcount = cur.rowcount
+        cur.execute(f"DROP TABLE {stg}")
+    return rowcount
+
+
+def upsert_dataframe_copy(
+    df: pd.DataFrame, table: str, conflict_cols: list, update_cols: list
+):
+    """自行開啟連線的 COPY upsert 薄包裝，附重試邏輯"""
+    if df.empty:
+        return 0
+
+    for attempt in range(1, DB_MAX_RETRIES + 1):
+        try:
+            with get_db_connection() as conn:
+                with conn.begin():
+                    return _copy_upsert_on_conn(
+                        conn, df, table, conflict_cols, update_cols
+                    )
+
+        except Exception as e:
+            logger.error(f"COPY 寫入資料庫時出錯 (嘗試 {attempt}/{DB_MAX_RETRIES}): {str(e)}")
+            if attempt < DB_MAX_RETRIES:
+                logger.info(f"等待 {DB_RETRY_DELAY} 秒後重試...")
+                time.sleep(DB_RETRY_DELAY)
+            else:
+                logger.error("已達最大重試次數，放棄寫入")
+                raise
+
     return 0
 
 
-def handle_single_stock(stock_id: str) -> None:
-    """整合流程：爬取→解析→寫入"""
+def _init_worker(download_dir: str, bucket_lock, bucket_state, need_driver: bool) -> None:
+    """Pool initializer：每個 worker process 建立常駐 WebDriver 與資料庫引擎
+
+    spawn 模式下模組全域不共享，節流狀態需由 main 建立後傳入。
+    走 HTTP 路徑時不預先啟動 Chrome（Selenium 備援會自建 driver）。
+    """
+    global _worker_driver, engine, _bucket
+    _bucket = TokenBucket(
+        RATE_PER_SEC, RATE_CAPACITY, lock=bucket_lock, state=bucket_state
+    )
+    # worker 只需要一條連線，用 NullPool 避免每個 process 各養一個 pool
+    engine = _create_engine_with_retry(poolclass=NullPool)
+    if need_driver:
+        _worker_driver = setup_driver(download_dir)
+
+
+def _handle_stock_worker(
+    stock_id: str, driver=None, save_pdf: bool = False, use_selenium: bool = False
+) -> None:
+    """供 pool.map 使用的包裝，錯誤只記錄、不讓整個 map 中斷"""
+    try:
+        handle_single_stock(
+            stock_id, driver=driver, save_pdf=save_pdf, use_selenium=use_selenium
+        )
+    except Exception as e:
+        logger.exception(f"處理 {stock_id} 時發生未預期錯誤: {str(e)}")
+
+
+def handle_single_stock(
+    stock_id: str, driver=None, save_pdf: bool = False, use_selenium: bool = False
+) -> None:
+    """整合流程：爬取→解析→寫入
+
+    預設走直接 HTTP 路徑（快 10 倍以上）；需要 PDF、指定
+    --use_selenium 或 HTTP 抓不到時才動用 Selenium。
+    """
     logger.info(f"開始處理 {stock_id}")
     if not validate_stock_id(stock_id):
         logger.warning(f"{stock_id} 代碼格式警告，但繼續")
-    pdf_path, dfs = get_mops_company_info_pdf(stock_id)
-    if pdf_path is None or not dfs:
+    _throttle()
+
+    pdf_path, dfs = None, None
+    if not (use_selenium or save_pdf):
+        dfs = get_mops_company_info_http(stock_id)
+    if not dfs:
+        pdf_path, dfs = get_mops_company_info_pdf(
+            stock_id, driver=driver, generate_pdf=save_pdf
+        )
+    if not dfs:
         logger.error(f"{stock_id} 爬取失敗")
         return
 
-    # 基本資料
-    df_basic = process_basic_info(stock_id, dfs[0])
-    if not df_basic.empty:
-        upsert_dataframe(
-            df_basic,
-            "company_info",
-            ["company_id"],
-            [c for c in df_basic.columns if c != "company_id"],
+    _store_stock_data(stock_id, dfs)
+
+    if pdf_path:
+        logger.info(f"{stock_id} 處理完成，PDF 已儲存: {pdf_path}")
+    else:
+        logger.info(f"{stock_id} 處理完成")
+
+
+async def _fetch_one(client, sem, company_id: str):
+    """非同步抓取單支股票的頁面 HTML，失敗回傳 (company_id, None)
+
+    重試採指數退避（2、4、8 秒），在 semaphore 內等待，
+    同時也佔住一個在途請求額度，避免重試風暴。
+    """
+    async with sem:
+        for attempt in range(1, MAX_RETRIES + 1):
+            await asyncio.to_thread(_throttle)
+            try:
+                resp = await client.post(
+                    MOPS_API_URL, json={"companyId": company_id}, timeout=10
+                )
+                resp.raise_for_status()
+                return company_id, resp.text
+            except httpx.HTTPError as e:
+                logger.warning(
+                    f"{company_id} 非同步抓取失敗 (第 {attempt} 次): {str(e)}"
+                )
+                if attempt < MAX_RETRIES:
+                    await asyncio.sleep(2**attempt)
+        return company_id, None
+
+
+async def main_async(stock_list, save_pdf: bool = False) -> None:
+    """以 asyncio + httpx 併發抓取所有股票
+
+    網路等待互相重疊，解析與資料庫寫入丟到執行緒，
+    抓不到的股票再逐支退回 Selenium。
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES)
+    headers = {
+        "User-Agent": (
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+        ),
+        "Accept-Language": "zh-TW,zh;q=0.9",
+    }
+    async with httpx.AsyncClient(
+        verify=False, limits=limits, headers=headers
+    ) as client:
+        results = await asyncio.gather(
+            *(_fetch_one(client, sem, sid) for sid in stock_list)
         )
 
-    # 營收
-    if len(dfs) > 2:
-        df_rev = parse_revenue_data(dfs[2], stock_id)
-        if not df_rev.empty:
-            upsert_dataframe(
-                df_rev,
-                "company_revenue",
-                ["company_id", "year", "month", "revenue_type"],
-                ["current_revenue", "previous_revenue", "growth_rate"],
+    # 解析先全部累積，最後每張表只打一次資料庫
+    frames_by_table = collections.defaultdict(list)
+    for sid, html in results:
+        dfs = None
+        if html and check_data_available_html(html, sid):
+            dfs = _parse_tables(html)
+            if not dfs:
+                logger.warning(f"{sid} HTTP 回應無法解析為表格")
+        if dfs:
+            frames = await asyncio.to_thread(_parse_stock_frames, sid, dfs)
+            for table, df in frames.items():
+                frames_by_table[table].append(df)
+        else:
+            # 逐支退回 Selenium 路徑（即時寫入）
+            await asyncio.to_thread(
+                _handle_stock_worker, sid, None, save_pdf, True
             )
 
-    # 財報
-    if len(dfs) > 3:
-        df_fin = process_financial_statements(dfs[3], stock_id)
-        if not df_fin.empty:
-            # 分拆各表 upsert
-            upsert_dataframe(
-                df_fin[
-                    [
-                        "company_id",
-                        "year",
-                        "total_assets",
-                        "total_liabilities",
-                        "total_equity",
-                        "net_worth_per_share",
-                    ]
-                ],
-                "balance_sheet",
-                ["company_id", "year"],
-                [
-                    "total_assets",
-                    "total_liabilities",
-                    "total_equity",
-                    "net_worth_per_share",
-                ],
-            )
-            upsert_dataframe(
-                df_fin[
-                    [
-                        "company_id",
-                        "year",
-                        "operating_revenue",
-                        "operating_profit",
-                        "profit_before_tax",
-                        "earnings_per_share",
-                    ]
-                ],
-                "income_statement",
-                ["company_id", "year"],
-                [
-                    "operating_revenue",
-                    "operating_profit",
-                    "profit_before_tax",
-                    "earnings_per_share",
-                ],
-            )
-            upsert_dataframe(
-                df_fin[
-                    [
-                        "company_id",
-                        "year",
-                        "operating_cash_flow",
-                        "investing_cash_flow",
-                        "financing_cash_flow",
-                    ]
-                ],
-                "cash_flow",
-                ["company_id", "year"],
-                ["operating_cash_flow", "investing_cash_flow", "financing_cash_flow"],
-            )
-            # 合併表
-            upsert_dataframe(
-                df_fin,
-                "financial_data_combined",
-                ["company_id", "year"],
-                [c for c in df_fin.columns if c not in ["company_id", "year"]],
+    await asyncio.to_thread(batch_upsert, frames_by_table)
+
+
+def _parse_stock_frames(stock_id: str, dfs: list) -> dict:
+    """解析單支股票抓回的表格，回傳 {資料表名稱: DataFrame}"""
+    frames = {}
+
+    df_basic = process_basic_info(stock_id, dfs[0])
+    if not df_basic.empty:
+        frames["company_info"] = df_basic
+
+    df_rev = parse_revenue_data(dfs[2], stock_id) if len(dfs) > 2 else pd.DataFrame()
+    if not df_rev.empty:
+        frames["company_revenue"] = df_rev
+
+    df_fin = (
+        process_financial_statements(dfs[3], stock_id)
+        if len(dfs) > 3
+        else pd.DataFrame()
+    )
+    if not df_fin.empty:
+        # 合併表已改為 materialized view，只寫三張來源財報表
+        for table, cols in _FIN_TABLE_COLS.items():
+            frames[table] = df_fin[cols]
+
+    return frames
+
+
+def batch_upsert(frames_by_table: dict) -> None:
+    """把多支股票累積的 DataFrame 合併後，每張表一次 upsert
+
+    所有表共用一條連線、一個交易，N 支股票 × 5 張表的寫入
+    收斂成每表一個多列 INSERT 加單一 COMMIT。
+    """
+    if not frames_by_table:
+        return
+    merged = {
+        table: pd.concat(frame_list, ignore_index=True)
+        for table, frame_list in frames_by_table.items()
+    }
+
+    # 整個 flush 是單一交易，失敗時整批重試
+    for attempt in range(1, DB_MAX_RETRIES + 1):
+        try:
+            with get_db_connection() as conn:
+                with conn.begin():
+                    for table, df in merged.items():
+                        conflict_cols = _TABLE_CONFLICT_COLS[table]
+                        update_cols = [
+                            c for c in df.columns if c not in conflict_cols
+                        ]
+                        if len(df) > COPY_THRESHOLD:
+                            _copy_upsert_on_conn(
+                                conn, df, table, conflict_cols, update_cols
+                            )
+                        else:
+                            _upsert_on_conn(
+                                conn, df, table, conflict_cols, update_cols
+                            )
+            return
+        except Exception as e:
+            logger.error(f"寫入資料庫時出錯 (嘗試 {attempt}/{DB_MAX_RETRIES}): {str(e)}")
+            if attempt < DB_MAX_RETRIES:
+                logger.info(f"等待 {DB_RETRY_DELAY} 秒後重試...")
+                time.sleep(DB_RETRY_DELAY)
+            else:
+                logger.error("已達最大重試次數，放棄寫入")
+                raise
+
+
+def refresh_financial_view() -> None:
+    """重整 financial_data_combined materialized view
+
+    REFRESH ... CONCURRENTLY 不能在交易內執行，
+    改用一條 AUTOCOMMIT 連線單獨送出。
+    """
+    global engine
+    if engine is None:
+        engine = _create_engine_with_retry()
+    try:
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+                text("REFRESH MATERIALIZED VIEW CONCURRENTLY financial_data_combined")
             )
+        logger.info("financial_data_combined 已重整")
+    except Exception:
+        logger.exception("重整 financial_data_combined 失敗")
 
-    logger.info(f"{stock_id} 處理完成，PDF 已儲存: {pdf_path}")
+
+def _store_stock_data(stock_id: str, dfs: list) -> None:
+    """解析抓回的表格並寫入資料庫（單支股票的即時寫入路徑）"""
+    frames = _parse_stock_frames(stock_id, dfs)
+    batch_upsert({table: [df] for table, df in frames.items()})
 
 
 def check_db_connectivity():
@@ -684,6 +1285,23 @@ def main():
     parser.add_argument(
         "--check_db", action="store_true", help="僅檢查資料庫連線"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="平行爬取的 worker 數（每個 worker 一個 Chrome），1 表示循序處理",
+    )
+    parser.add_argument(
+        "--save_pdf",
+        "--save-pdf",
+        action="store_true",
+        help="另外將每支股票頁面存成 PDF 檔",
+    )
+    parser.add_argument(
+        "--use_selenium",
+        action="store_true",
+        help="強制使用 Selenium 抓取（預設先嘗試直接 HTTP）",
+    )
     args = parser.parse_args()
 
     # 檢查資料庫連線（如果指定）
@@ -712,17 +1330,46 @@ def main():
     stock_list = args.stock_ids or DEFAULT_STOCK_IDS
     logger.info(f"將處理 {len(stock_list)} 支股票")
 
-    for idx, sid in enumerate(stock_list, start=1):
-        logger.info(f"進度 {idx}/{len(stock_list)}: 處理 {sid}")
-        try:
-            handle_single_stock(sid)
-        except Exception as e:
-            logger.exception(f"處理 {sid} 時發生未預期錯誤: {str(e)}")
-        
-        # 避免過度頻繁
-        if idx < len(stock_list):
-            logger.info(f"等待 3 秒後處理下一支股票...")
-            time.sleep(3)
+    # 只有 Selenium 模式（或要產 PDF）才需要預先啟動 Chrome
+    need_driver = args.use_selenium or args.save_pdf
+
+    if not need_driver:
+        # 純資料抓取：非同步 HTTP 併發，不需要 process pool
+        asyncio.run(main_async(stock_list, save_pdf=args.save_pdf))
+    elif args.workers > 1:
+        # 爬取為 I/O-bound，用 process pool 平行處理
+        # 以 spawn 啟動，避免 fork 到 Selenium/資料庫連線的狀態
+        ctx = multiprocessing.get_context("spawn")
+        bucket_lock = ctx.Lock()
+        bucket_state = ctx.Array("d", [RATE_CAPACITY, 0.0])
+        with ctx.Pool(
+            processes=args.workers,
+            initializer=_init_worker,
+            initargs=(DOWNLOAD_DIR, bucket_lock, bucket_state, need_driver),
+        ) as pool:
+            pool.map(
+                functools.partial(
+                    _handle_stock_worker,
+                    save_pdf=args.save_pdf,
+                    use_selenium=args.use_selenium,
+                ),
+                stock_list,
+            )
+    else:
+        # 循序模式也只開一個 Chrome，所有股票共用同一個 session；
+        # 不顯式傳遞 driver，讓 session 掛掉重建後的實例能被接續使用
+        # 節流交給 handle_single_stock 裡的 _throttle
+        with mops_driver():
+            for idx, sid in enumerate(stock_list, start=1):
+                logger.info(f"進度 {idx}/{len(stock_list)}: 處理 {sid}")
+                _handle_stock_worker(
+                    sid,
+                    save_pdf=args.save_pdf,
+                    use_selenium=args.use_selenium,
+                )
+
+    # 寫入完成後一次重整合併視圖
+    refresh_financial_view()
 
     logger.info("所有股票處理完成")
 
@@ -33,22 +33,40 @@ DATABASE_URL = os.getenv("DATABASE_URL", default_url)
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
 
-def verify_stock(stock_id: str) -> dict:
-    """回傳該 stock_id 在各表中的資料筆數"""
-    queries = {
-        "company_info": "SELECT COUNT(*) FROM company_info WHERE company_id = :stock_id",
-        "company_revenue": "SELECT COUNT(*) FROM company_revenue WHERE company_id = :stock_id",
-        "balance_sheet": "SELECT COUNT(*) FROM balance_sheet WHERE company_id = :stock_id",
-        "income_statement": "SELECT COUNT(*) FROM income_statement WHERE company_id = :stock_id",
-        "cash_flow": "SELECT COUNT(*) FROM cash_flow WHERE company_id = :stock_id",
-        "financial_data_combined": "SELECT COUNT(*) FROM financial_data_combined WHERE company_id = :stock_id",
-    }
-    results = {"company_id": stock_id}
+# 要檢查的資料表，依輸出欄位順序排列
+TABLES = [
+    "company_info",
+    "company_revenue",
+    "balance_sheet",
+    "income_statement",
+    "cash_flow",
+    "financial_data_combined",
+]
+
+
+def verify_stocks(stock_ids: list) -> pd.DataFrame:
+    """回傳各 stock_id 在各表中的資料筆數
+
+    六張表的 COUNT 以 UNION ALL 合併成單一查詢、一次往返，
+    不隨股票數量增加來回次數。
+    """
+    sql = "\nUNION ALL\n".join(
+        f"SELECT '{table}' AS tbl, company_id, COUNT(*) AS cnt "
+        f"FROM {table} WHERE company_id = ANY(:ids) GROUP BY company_id"
+        for table in TABLES
+    )
     with engine.connect() as conn:
-        for table, sql in queries.items():
-            count = conn.execute(text(sql), {"stock_id": stock_id}).scalar()
-            results[table] = int(count or 0)
-    return results
+        df = pd.read_sql_query(text(sql), conn, params={"ids": list(stock_ids)})
+
+    pivot = (
+        df.pivot(index="company_id", columns="tbl", values="cnt")
+        .reindex(index=list(stock_ids), columns=TABLES)
+        .fillna(0)
+        .astype(int)
+        .reset_index()
+    )
+    pivot.columns.name = None
+    return pivot
 
 
 def main():
@@ -63,12 +81,8 @@ def main():
     )
     args = parser.parse_args()
 
-    summary = []
-    for sid in args.stock_ids:
-        summary.append(verify_stock(sid))
-
     # 用 pandas 列印成表格
-    df = pd.DataFrame(summary)
+    df = verify_stocks(args.stock_ids)
     print("\n===== 資料庫寫入檢查結果 =====\n")
     print(df.to_string(index=False))
 